@@ -8,7 +8,16 @@ def session_scope(db_engine, sessionmaker_=sessionmaker, **kwargs):
     The session is created immediately before the scope begins, and is closed
     on scope exit.
     """
-    db_session = sessionmaker_(bind=db_engine, **kwargs)()
+    with factory_session_scope(sessionmaker_(bind=db_engine, **kwargs)) as db_session:
+        yield db_session
+
+@contextmanager
+def factory_session_scope(session_factory):
+    """
+    Provide a scoped db session from an already configured session factory,
+    so the factory does not need to be rebuilt for every series of operations.
+    """
+    db_session = session_factory()
     try:
         yield db_session
     finally:
@@ -2,36 +2,182 @@ import falcon
 import json
 import jsonschema
 import logging
+import re
+import types
+import weakref
 
+try:
+    import orjson
+    support_orjson = True
+except ImportError:
+    support_orjson = False
 
-def _get_request_schema(req, resource):
-    if resource is None or req.method not in ['POST', 'PUT', 'PATCH']:
-        return None
+try:
+    import jsonschema_rs
+    # validator_for was added in jsonschema-rs 0.20
+    support_jsonschema_rs = hasattr(jsonschema_rs, 'validator_for')
+except ImportError:
+    support_jsonschema_rs = False
+
+try:
+    import fastjsonschema
+    support_fastjsonschema = True
+except ImportError:
+    support_fastjsonschema = False
+
+
+# orjson parses integers outside the 64 bit range as floats, losing precision,
+# so bodies with digit runs long enough to reach it are left to json
+_LONG_DIGITS = re.compile(rb'[0-9]{19}')
+
+def _loads(body):
+    """
+    Parse a JSON document straight from the request bytes, using orjson where
+    it is installed and can parse the document exactly.
+    """
+    if support_orjson and _LONG_DIGITS.search(body) is None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+def _dumps(obj):
+    """
+    Serialize to a UTF-8 encoded JSON document, using orjson where it is
+    installed and able to serialize the object.
+    """
+    if support_orjson:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson refuses some values json accepts, e.g. integers over 64 bits
+            pass
+    return json.dumps(obj).encode('utf-8')
+
+# Read-only, as these are shared by every request
+_REQ_METHOD_ATTR = types.MappingProxyType({'POST': 'on_post', 'PUT': 'on_put', 'PATCH': 'on_patch'})
+_WRITE_METHODS = frozenset(_REQ_METHOD_ATTR)
+_RESP_METHOD_ATTR = types.MappingProxyType({'POST': 'on_post', 'PUT': 'on_put', 'PATCH': 'on_patch', 'GET': 'on_get', 'DELETE': 'on_delete'})
+
+# fastjsonschema treats schemas without $schema as draft-07, where jsonschema
+# uses the latest draft, so it is only trusted with drafts it names explicitly
+_FASTJSONSCHEMA_DRAFTS = frozenset(
+    '{0}://json-schema.org/{1}/schema{2}'.format(scheme, draft, suffix)
+    for scheme in ['http', 'https']
+    for draft in ['draft-04', 'draft-06', 'draft-07']
+    for suffix in ['', '#']
+)
+
+def _compile_validator(schema):
+    """
+    Build a function validating an instance against the schema, raising
+    jsonschema.exceptions.ValidationError if it does not conform.  The fastest
+    installed backend that accepts the schema is used: jsonschema-rs, then
+    fastjsonschema, then jsonschema itself.
+    """
+    if support_jsonschema_rs:
+        try:
+            # As with jsonschema, which is given no format checker
+            rs_validator = jsonschema_rs.validator_for(schema, validate_formats=False)
+        except (ValueError, TypeError):
+            # TypeError if the release predates validate_formats
+            rs_validator = None
+        if rs_validator is not None:
+            def validate(instance):
+                try:
+                    rs_validator.validate(instance)
+                except jsonschema_rs.ValidationError as error:
+                    raise jsonschema.exceptions.ValidationError(str(error))
+            return validate
+
+    if support_fastjsonschema and schema.get('$schema') in _FASTJSONSCHEMA_DRAFTS:
+        try:
+            # jsonschema is given no format checker, so formats are not checked
+            compiled = fastjsonschema.compile(schema, use_default=False, use_formats=False)
+        except (fastjsonschema.JsonSchemaDefinitionException, TypeError):
+            # TypeError if the release predates use_formats
+            compiled = None
+        if compiled is not None:
+            def validate(instance):
+                try:
+                    compiled(instance)
+                except fastjsonschema.JsonSchemaValueException as error:
+                    raise jsonschema.exceptions.ValidationError(str(error))
+            return validate
+
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    validator = cls(schema)
+    def validate(instance):
+        error = jsonschema.exceptions.best_match(validator.iter_errors(instance))
+        if error is not None:
+            raise error
+    return validate
+
+class _CompiledSchema(object):
+    """
+    A schema along with its validator, which is compiled the first time the
+    schema is used and then kept for the life of the resource class.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self._validate = None
+
+    def validate(self, instance):
+        if self._validate is None:
+            self._validate = _compile_validator(self.schema)
+        self._validate(instance)
 
+def _resolve_schema(cls, method_name, schema_attr, class_schemas_attr):
     # First try to get schema from method itself
-    schema = getattr(
-        getattr(resource, {'POST': 'on_post', 'PUT': 'on_put', 'PATCH': 'on_patch'}[req.method], None),
-        '__request_schema__',
-        None
-    # Otherwise, fall back to schema defined directly in class
-    ) or getattr(resource, '__request_schemas__', {}).get(
-        {'POST': 'on_post', 'PUT': 'on_put', 'PATCH': 'on_patch'}[req.method]
-    )
+    schema = getattr(getattr(cls, method_name, None), schema_attr, None)
+    if not schema:
+        # Otherwise, fall back to schema defined directly in class
+        schema = getattr(cls, class_schemas_attr, {}).get(method_name)
     return schema
 
-def _get_response_schema(resource, req):
-    try:
-        method_name = {'POST': 'on_post', 'PUT': 'on_put', 'PATCH': 'on_patch', 'GET': 'on_get', 'DELETE': 'on_delete'}[req.method]
-    except KeyError:
-        return
+def _build_schema_map(cls):
+    """
+    Map ('request' or 'response', HTTP method) to the compiled schema for
+    every responder of the class that has one.
+    """
+    schema_map = {}
+    for kind, method_attr, schema_attr, class_schemas_attr in [
+        ('request', _REQ_METHOD_ATTR, '__request_schema__', '__request_schemas__'),
+        ('response', _RESP_METHOD_ATTR, '__response_schema__', '__response_schemas__'),
+    ]:
+        for method, method_name in method_attr.items():
+            schema = _resolve_schema(cls, method_name, schema_attr, class_schemas_attr)
+            if schema:
+                schema_map[(kind, method)] = _CompiledSchema(schema)
+    return schema_map
 
-    # First try to get schema from method itself
-    return getattr(
-        getattr(resource, method_name, None),
-        '__response_schema__',
-        None
-    # Otherwise, fall back to schema defined directly in class
-    ) or getattr(resource, '__response_schemas__', {}).get(method_name)
+# Schemas never change once a resource class is defined, so they are resolved
+# once per class, and each is compiled once
+_schema_maps = weakref.WeakKeyDictionary()
+
+def _get_schema(kind, req, resource):
+    if resource is None:
+        return None
+    cls = type(resource)
+    schema_map = _schema_maps.get(cls)
+    if schema_map is None:
+        schema_map = _schema_maps[cls] = _build_schema_map(cls)
+    return schema_map.get((kind, req.method))
+
+# Methods for which each resource class keeps the raw request body
+_keep_request_body = weakref.WeakKeyDictionary()
+
+def _get_keep_request_body(resource):
+    cls = type(resource)
+    methods = _keep_request_body.get(cls)
+    if methods is None:
+        methods = _keep_request_body[cls] = frozenset(getattr(cls, 'keep_request_body', None) or ())
+    return methods
+
+def _get_request_schema(req, resource):
+    return _get_schema('request', req, resource)
+
+def _get_response_schema(resource, req):
+    return _get_schema('response', req, resource)
 
 
 class _null_handler(logging.Handler):
@@ -47,17 +193,28 @@ class Middleware(object):
         self.logger = logger
 
     def process_resource(self, req, resp, resource, params):
-        if _get_response_schema(resource, req) and not req.client_accepts_json:
+        if resource is None:
+            return
+
+        context = req.context
+        method = req.method
+
+        # Kept for process_response, so the lookup is only done once
+        context['_resp_schema'] = resp_schema = _get_response_schema(resource, req)
+        if resp_schema and not req.client_accepts_json:
             raise falcon.HTTPNotAcceptable('This API supports only JSON-encoded responses')
 
-        if resource is None or req.method not in ['POST', 'PUT', 'PATCH']:
+        if method not in _WRITE_METHODS:
             return
 
-        if _get_request_schema(req, resource) is not None:
-            if req.content_type is None or 'application/json' not in req.content_type:
-                raise falcon.HTTPUnsupportedMediaType('This API supports only JSON-encoded requests')
+        content_type = req.content_type
+        is_json = content_type is not None and content_type.startswith('application/json')
 
-        if req.content_type is not None and 'application/json' in req.content_type:
+        schema = _get_request_schema(req, resource)
+        if schema is not None and not is_json:
+            raise falcon.HTTPUnsupportedMediaType('This API supports only JSON-encoded requests')
+
+        if is_json:
             body = req.stream.read(req.content_length or 0)
 
             if not body:
@@ -66,24 +223,29 @@ class Middleware(object):
                     'A valid JSON document is required'
                 )
 
-            if req.method in getattr(resource, 'keep_request_body', []):
-                req.context['request_body'] = body
+            if method in _get_keep_request_body(resource):
+                context['request_body'] = body
 
-            schema = _get_request_schema(req, resource)
             try:
-                req.context['doc'] = json.loads(body.decode('utf-8'))
-            except (ValueError, UnicodeDecodeError) as error:
+                doc = _loads(body)
+            except ValueError as error:
                 if schema is not None:
                     raise falcon.HTTPBadRequest(
                         'Malformed JSON',
                         'Could not decode the request body.  The JSON was incorrect or not encoded as UTF-8'
                     )
-                req.context['doc'] = body
-            req._media = req.context['doc']
+                doc = body
+            # Unless it is kept, let the raw body be freed before validation
+            del body
+            context['doc'] = doc
+            # Falcon has no public setter for req.media, and its stream has
+            # already been consumed, so hand over the parsed document
+            # directly rather than letting req.media try to parse it again
+            req._media = doc
 
             if schema is not None:
                 try:
-                    jsonschema.validate(req.context['doc'], schema)
+                    schema.validate(doc)
                 except jsonschema.exceptions.ValidationError as error:
                     raise falcon.HTTPBadRequest(
                         'Invalid request body',
@@ -94,27 +256,29 @@ class Middleware(object):
         self.process_resource(req, resp, resource, params)
 
     def process_response(self, req, resp, resource, req_succeeded):
-        if 'result' not in req.context or (resp.data and len(resp.data) > 0):
+        context = req.context
+        if 'result' not in context or (resp.data and len(resp.data) > 0):
             # If there's no response to process or a different middleware set the response to something, do nothing in this one.
             return
 
-        result = req.context['result']
-        use_text = hasattr(resp, 'text') # Falcon 3 deprecates the use of response.body, .text should be used instead
-        resp_content_key = 'text' if use_text else 'body'
-        has_metadata = 'data' in result and not 'meta' in result
-        resp_data = json.dumps(result['data'] if has_metadata else result)
-        setattr(resp, resp_content_key, resp_data)
+        result = context['result']
 
-        schema = _get_response_schema(resource, req)
-        if schema is None:
-            return
+        if '_resp_schema' in context:
+            schema = context['_resp_schema']
+        else:
+            schema = _get_response_schema(resource, req)
+        if schema is not None:
+            # Validate before serializing, so a blocked response is never encoded
+            try:
+                schema.validate(result)
+            except jsonschema.exceptions.ValidationError as error:
+                method_name = _RESP_METHOD_ATTR[req.method]
+                self.logger.error('Blocking proposed response from being sent from {0}.{1}.{2} to client as it does not match the defined schema: {3}'.format(resource.__module__, resource.__class__.__name__, method_name, str(error)))
+                raise falcon.HTTPInternalServerError('Internal Server Error', 'Undisclosed')
 
-        try:
-            jsonschema.validate(req.context['result'], schema)
-        except jsonschema.exceptions.ValidationError as error:
-            method_name = {'POST': 'on_post', 'PUT': 'on_put', 'PATCH': 'on_patch', 'GET': 'on_get', 'DELETE': 'on_delete'}[req.method]
-            self.logger.error('Blocking proposed response from being sent from {0}.{1}.{2} to client as it does not match the defined schema: {3}'.format(resource.__module__, resource.__class__.__name__, method_name, str(error)))
-            raise falcon.HTTPInternalServerError('Internal Server Error', 'Undisclosed')
+        has_metadata = 'data' in result and not 'meta' in result
+        # Setting the encoded bytes directly saves Falcon from encoding text
+        resp.data = _dumps(result['data'] if has_metadata else result)
 
     async def process_response_async(self, req, resp, resource, req_succeeded):
         self.process_response(req, resp, resource, req_succeeded)
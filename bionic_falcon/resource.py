@@ -1,9 +1,12 @@
+from contextlib import contextmanager
 from datetime import date, datetime, time
 from time import mktime
 from decimal import Decimal
 import falcon
 import falcon.errors
+import hashlib
 import itertools
+import json
 import sqlalchemy.exc
 import sqlalchemy.orm.exc
 from sqlalchemy.orm import sessionmaker
@@ -14,7 +17,7 @@ import sqlalchemy.sql.sqltypes
 import uuid
 import logging
 
-from .db_session import session_scope
+from .db_session import factory_session_scope
 
 def identify(req, resp, resource, params):
     identifiers = getattr(resource, '__identifiers__', {})
@@ -42,6 +45,8 @@ except ImportError:
     support_geo = False
 
 
+_COLUMN_FIELDS_CACHE_SIZE = 256
+
 def _get_response_fields(self, req, resp, resource, *args, **kwargs):
     response_fields = getattr(self, 'response_fields', None)
     if callable(response_fields):
@@ -49,6 +54,20 @@ def _get_response_fields(self, req, resp, resource, *args, **kwargs):
     else:
         return response_fields
 
+def _compile_meta(meta):
+    """
+    Compile a dict of meta callables into a single function that builds the
+    meta dict, so evaluating it per resource is one call rather than a loop.
+    """
+    namespace = {}
+    entries = []
+    for index, (key, fxn) in enumerate(meta.items()):
+        namespace['_k{0}'.format(index)] = key
+        namespace['_f{0}'.format(index)] = fxn
+        entries.append('_k{0}: _f{0}(*resource)'.format(index))
+    exec('def evaluate(*resource):\n    return {{{0}}}\n'.format(', '.join(entries)), namespace)
+    return namespace['evaluate']
+
 class BaseResource(object):
     def _is_foreign_key_violation(self, error):
         args = error.orig.args
@@ -70,6 +89,7 @@ class BaseResource(object):
         self.db_engine = db_engine
         self.sessionmaker = sessionmaker_
         self.sessionmaker_kwargs = sessionmaker_kwargs
+        self.session_factory = sessionmaker_(bind=db_engine, **sessionmaker_kwargs)
         if logger is None:
             logger = logging.getLogger('bionic')
         self.logger = logger
@@ -154,6 +174,28 @@ class BaseResource(object):
             serialize_filters.append(filter_tuple)
         self.serialize_filters = [ *serialize_filters, *default_serialize_filters ]
 
+        self._arg_filters = {}
+        self._column_attrs = {}
+        self._column_fields_cache = {}
+
+        # Attribute holding the version counter of versioned models
+        self._version_key = None
+        model = getattr(self, 'model', None)
+        if model is not None:
+            mapper = inspect(model)
+            if mapper.version_id_col is not None:
+                self._version_key = mapper.get_property_by_column(mapper.version_id_col).key
+
+        self._has_post_defaults     = len(getattr(self, 'post_defaults', {})) > 0
+        self._has_put_defaults      = len(getattr(self, 'put_defaults', {})) > 0
+        self._has_patch_defaults    = len(getattr(self, 'patch_defaults', {})) > 0
+
+        self._compiled_meta = {
+            name: _compile_meta(getattr(self, name))
+            for name in ['meta', 'resource_meta']
+            if isinstance(getattr(self, name, None), dict) and len(getattr(self, name)) > 0
+        }
+
     def param_string_to_list(self, value: str):
         if not value.startswith('[') or not value.endswith(']'):
             raise falcon.errors.HTTPBadRequest('Invalid attribute', f'Query __in filter value \'{value}\' is an invalid list string. Lists should be formatted as [a,b,c].')
@@ -162,31 +204,42 @@ class BaseResource(object):
             raise falcon.errors.HTTPBadRequest('Invalid attribute', f'Query __in filter provided an empty list string. Please omit unused parameters.')
         return value.split(',')
 
+    def _column_attribute(self, name):
+        """
+        Return the model attribute for the named column, or None if the model
+        has no such column.  Valid names are cached, so the mapper is only
+        inspected once for each; invalid ones come from clients and are not.
+        """
+        attr = self._column_attrs.get(name)
+        if attr is None and isinstance(inspect(self.model).attrs.get(name), ColumnProperty):
+            attr = self._column_attrs[name] = getattr(self.model, name)
+        return attr
+
     def filter_by_params(self, resources, params):
+        clauses = []
         for filter_key, value in params.items():
             if filter_key.startswith('__'):
                 # Not a filtering parameter
                 continue
-            filter_parts = filter_key.split('__')
-            key = filter_parts[0]
-            if len(filter_parts) == 1:
+            key, separator, comparison = filter_key.partition('__')
+            if not separator:
                 comparison = '='
-            elif len(filter_parts) == 2:
-                comparison = filter_parts[1]
-            else:
+            elif '__' in comparison:
                 raise falcon.errors.HTTPBadRequest('Invalid attribute', 'An attribute provided for filtering is invalid')
 
-            attr = getattr(self.model, key, None)
-            if attr is None or not isinstance(inspect(self.model).attrs[key], ColumnProperty):
+            attr = self._column_attribute(key)
+            if attr is None:
                 self.logger.warn('An attribute ({0}) provided for filtering is invalid'.format(key))
                 raise falcon.errors.HTTPBadRequest('Invalid attribute', 'An attribute provided for filtering is invalid')
 
             filter_fxn = self.param_filters.get(comparison, None)
             if filter_fxn is None:
                 raise falcon.errors.HTTPBadRequest('Invalid attribute', 'An attribute provided for filtering is invalid')
-            resources = resources.filter(filter_fxn(attr, value))
+            clauses.append(filter_fxn(attr, value))
 
-        return resources
+        if not clauses:
+            return resources
+        return resources.filter(*clauses)
 
     def _serialize_value(self, name, value, attrs, geometry_axes):
         for condition_fxn, value_fxn in self.serialize_filters:
@@ -194,12 +247,28 @@ class BaseResource(object):
                 return value_fxn(value=value, name=name, attrs=attrs, geometry_axes=geometry_axes)
         return value
 
+    def _column_fields(self, model, response_fields):
+        """
+        Return the response fields of a model that are columns, resolved once
+        per model and list of fields.
+        """
+        key = (model, None if response_fields is None else tuple(response_fields))
+        fields = self._column_fields_cache.get(key)
+        if fields is None:
+            attrs = inspect(model).attrs
+            if response_fields is None:
+                response_fields = attrs.keys()
+            fields = tuple(attr for attr in response_fields if isinstance(attrs[attr], ColumnProperty))
+            # Fields chosen programmatically could vary without limit
+            if len(self._column_fields_cache) < _COLUMN_FIELDS_CACHE_SIZE:
+                self._column_fields_cache[key] = fields
+        return fields
+
     def serialize(self, resource, response_fields=None, geometry_axes=None):
-        attrs           = inspect(resource.__class__).attrs
-        if response_fields is None:
-            response_fields = attrs.keys()
+        model           = resource.__class__
+        attrs           = inspect(model).attrs
         return {
-            attr: self._serialize_value(attr, getattr(resource, attr), attrs, geometry_axes) for attr in response_fields if isinstance(attrs[attr], ColumnProperty)
+            attr: self._serialize_value(attr, getattr(resource, attr), attrs, geometry_axes) for attr in self._column_fields(model, response_fields)
         }
 
     def _inbound_attribute(self, name):
@@ -265,17 +334,17 @@ class BaseResource(object):
                     attributes[key] = time(int(hour), int(minute), int(second))
                 else:
                     attributes[key] = None
-            elif support_geo and isinstance(column.type, Geometry) and column.type.geometry_type in ['POINT', 'POINTZ']:
+            elif support_geo and isinstance(column.type, Geometry) and column.type.geometry_type in {'POINT', 'POINTZ'}:
                 axes    = getattr(self, 'geometry_axes', {}).get(key, ['x', 'y', 'z'] if column.type.geometry_type == 'POINTZ' else ['x', 'y'])
                 point   = Point(*list(value.get(axes[index], 0) for index in range(0, len(axes))))
                 # geoalchemy2.shape.from_shape uses buffer() which causes INSERT to fail
                 attributes[key] = WKBElement(point.wkb, srid=4326)
-            elif support_geo and isinstance(column.type, Geometry) and column.type.geometry_type in ['LINESTRING', 'LINESTRINGZ']:
+            elif support_geo and isinstance(column.type, Geometry) and column.type.geometry_type in {'LINESTRING', 'LINESTRINGZ'}:
                 axes    = getattr(self, 'geometry_axes', {}).get(key, ['x', 'y', 'z'] if column.type.geometry_type == 'LINESTRINGZ' else ['x', 'y'])
                 line    = LineString([point.get(axes[index], 0) for index in range(0, len(axes))] for point in value)
                 # geoalchemy2.shape.from_shape uses buffer() which causes INSERT to fail
                 attributes[key] = WKBElement(line.wkb, srid=4326)
-            elif support_geo and isinstance(column.type, Geometry) and column.type.geometry_type in ['POLYGON', 'POLYGONZ']:
+            elif support_geo and isinstance(column.type, Geometry) and column.type.geometry_type in {'POLYGON', 'POLYGONZ'}:
                 axes    = getattr(self, 'geometry_axes', {}).get(key, ['x', 'y', 'z'] if column.type.geometry_type == 'POLYGONZ' else ['x', 'y'])
                 polygon = Polygon([point.get(axes[index], 0) for index in range(0, len(axes))] for point in value)
                 # geoalchemy2.shape.from_shape uses buffer() which causes INSERT to fail
@@ -312,40 +381,103 @@ class BaseResource(object):
 
         return list(zip(*deserialized))
 
-    def apply_arg_filter(self, req, resp, resources, kwargs):
-        for key, value in kwargs.items():
-            key = self._lookup_attribute(key)
+    def _resolve_arg_filters(self, names):
+        """
+        Resolve the names of a route's path parameters to the lookup functions
+        or column attributes used to filter on them.  Routes have a fixed set
+        of parameters, so the result is cached per set of names.
+        """
+        arg_filters = self._arg_filters.get(names)
+        if arg_filters is not None:
+            return arg_filters
+
+        arg_filters = []
+        for name in names:
+            key = self._lookup_attribute(name)
             if key is None:
                 continue
             elif callable(key):
-                resources = key(req, resp, resources, **kwargs)
+                arg_filters.append((name, key, True))
             else:
-                attr = getattr(self.model, key, None)
-                if attr is None or not isinstance(inspect(self.model).attrs[key], ColumnProperty):
+                attr = self._column_attribute(key)
+                if attr is None:
                     self.logger.error("Programming error: {0}.attr_map['{1}'] does not exist or is not a column".format(self.model, key))
                     raise falcon.errors.HTTPInternalServerError('Internal Server Error', 'An internal server error occurred')
-                resources = resources.filter(attr == value)
+                arg_filters.append((name, attr, False))
+        self._arg_filters[names] = arg_filters
+        return arg_filters
+
+    def apply_arg_filter(self, req, resp, resources, kwargs):
+        for name, attr, is_lookup_fxn in self._resolve_arg_filters(tuple(kwargs)):
+            if is_lookup_fxn:
+                resources = attr(req, resp, resources, **kwargs)
+            else:
+                resources = resources.filter(attr == kwargs[name])
         return resources
 
+    def _is_lock_not_available(self, error):
+        args = error.orig.args
+        backend = self.db_engine.url.get_backend_name()
+        if backend == 'postgresql':
+            return getattr(error.orig, 'pgcode', None) == '55P03' or (   # psycopg2
+                len(args) > 1 and args[0] == 'ERROR' and args[1] == '55P03'
+            )
+        elif backend == 'mysql':
+            # ER_LOCK_NOWAIT on MySQL, ER_LOCK_WAIT_TIMEOUT on MariaDB
+            return len(args) > 0 and args[0] in (3572, 1205)
+        elif backend == 'oracle':
+            # ORA-00054: resource busy and acquire with NOWAIT specified
+            return len(args) > 0 and getattr(args[0], 'code', None) == 54
+        return False
+
+    def lock_query(self, query):
+        """
+        Lock the rows selected by the query for the rest of the transaction
+        when the resource opts in with `lock_for_update`.  SQLite serializes
+        writes itself, so no lock is taken there.
+        """
+        if getattr(self, 'lock_for_update', False) and self.db_engine.url.get_backend_name() != 'sqlite':
+            return query.with_for_update(nowait=True)
+        return query
+
     def apply_default_attributes(self, defaults_type, req, resp, attributes):
         defaults = getattr(self, defaults_type, {})
         for key, setter in defaults.items():
             if key not in attributes:
                 attributes[key] = setter(req, resp, attributes)
     
-    def safe_commit(self, db_session):
+    @contextmanager
+    def _translate_db_errors(self, db_session, foreign_key=False, stale=False):
+        """
+        Roll back on any error raised within the block, translating database
+        constraint violations into HTTP conflicts.  Integrity errors are taken
+        to be foreign key violations if `foreign_key` is set, and unique
+        constraint violations otherwise.  Stale data errors are translated
+        if `stale` is set.
+        """
         try:
-            db_session.commit()
+            yield
         except sqlalchemy.exc.IntegrityError as err:
+            db_session.rollback()
+            if foreign_key:
+                # As far we I know, this should only be caused by foreign key constraint being violated
+                raise falcon.errors.HTTPConflict('Conflict', 'Other content links to this')
             # Cases such as unallowed NULL value should have been checked
             # before we got here (e.g. validate against schema
             # using the middleware) - therefore assume this is a UNIQUE
             # constraint violation
-            db_session.rollback()
             raise falcon.errors.HTTPConflict('Conflict', 'Unique constraint violated')
+        except sqlalchemy.orm.exc.StaleDataError as err:
+            db_session.rollback()
+            if not stale:
+                raise
+            # Version field in the model was not as expected
+            raise falcon.errors.HTTPConflict('Conflict', 'Resource found but conditions violated')
         except sqlalchemy.exc.ProgrammingError as err:
             db_session.rollback()
-            if self._is_unique_violation(err):
+            if foreign_key and self._is_foreign_key_violation(err):
+                raise falcon.errors.HTTPConflict('Conflict', 'Other content links to this')
+            elif not foreign_key and self._is_unique_violation(err):
                 raise falcon.errors.HTTPConflict('Conflict', 'Unique constraint violated')
             else:
                 raise
@@ -353,6 +485,10 @@ class BaseResource(object):
             db_session.rollback()
             raise
 
+    def safe_commit(self, db_session):
+        with self._translate_db_errors(db_session):
+            db_session.commit()
+
 class CollectionResource(BaseResource):
     """
     Provides CRUD facilities for a resource collection.
@@ -370,7 +506,9 @@ class CollectionResource(BaseResource):
         if 'GET' not in getattr(self, 'methods', ['GET', 'POST', 'PATCH']):
             raise falcon.errors.HTTPMethodNotAllowed(getattr(self, 'methods', ['GET', 'POST', 'PATCH']))
 
-        with session_scope(self.db_engine, sessionmaker_=self.sessionmaker, **self.sessionmaker_kwargs) as db_session:
+        with factory_session_scope(self.session_factory) as db_session:
+            # Reads only, so there is never anything to flush before a query
+            db_session.autoflush = False
             column_filters = kwargs
             before_get = getattr(self, 'before_get', None)
             if before_get is not None:
@@ -401,8 +539,8 @@ class CollectionResource(BaseResource):
                     if field_name[0] == '-':
                         field_name = field_name[1:]
                         reverse = True
-                    attr = getattr(self.model, field_name, None)
-                    if attr is None or not isinstance(inspect(self.model).attrs[field_name], ColumnProperty):
+                    attr = self._column_attribute(field_name)
+                    if attr is None:
                         if using_default_sort:
                             self.logger.error("Programming error: Sort field {0}.{1} does not exist or is not a column".format(self.model, field_name))
                             raise falcon.errors.HTTPInternalServerError('Internal Server Error', 'An internal server error occurred')
@@ -423,23 +561,30 @@ class CollectionResource(BaseResource):
                 resources = resources.limit(req.get_param_as_int('__limit'))
 
             resource_meta = getattr(self, 'resource_meta', {})
+            compiled_meta = self._compiled_meta.get('resource_meta')
 
             def add_meta(resource, attributes):
                 output = attributes.copy()
                 if callable(resource_meta):
                     if len(extra_select) > 0:
-                        meta_dict = resource_meta(req, resp, *list(itertools.chain(resource, args)), **kwargs)
+                        meta_dict = resource_meta(req, resp, *resource, *args, **kwargs)
                     else:
                         meta_dict = resource_meta(req, resp, resource, *args, **kwargs)
                     if meta_dict is not None:
                         output['meta'] = meta_dict
-                elif len(resource_meta.keys()) > 0:
+                elif compiled_meta is not None:
                     if len(extra_select) > 0:
-                        output['meta'] = {key: value(*resource) for key, value in resource_meta.items()}
+                        output['meta'] = compiled_meta(*resource)
                     else:
-                        output['meta'] = {key: value(resource) for key, value in resource_meta.items()}
+                        output['meta'] = compiled_meta(resource)
                 return output
 
+            yield_per = getattr(self, 'yield_per', None)
+            if yield_per:
+                # Load rows in batches, so each instance can be freed once it
+                # has been serialized
+                resources = resources.yield_per(yield_per)
+
             resp.status = falcon.HTTP_OK
             result = {
                 'data': [
@@ -479,7 +624,7 @@ class CollectionResource(BaseResource):
         body_data = req.context['doc'] if 'doc' in req.context else None
         attributes, linked_attributes = self.deserialize(self.model, kwargs, body_data, getattr(self, 'allow_subresources', False))
 
-        with session_scope(self.db_engine, sessionmaker_=self.sessionmaker, **self.sessionmaker_kwargs) as db_session:
+        with factory_session_scope(self.session_factory) as db_session:
             allowed_types = getattr(self, 'post_types', ['object', 'array'])
             is_array = type(body_data) is list
             if not 'array' in allowed_types and is_array:
@@ -487,8 +632,9 @@ class CollectionResource(BaseResource):
             if not ('object' in allowed_types or is_array):
                 raise falcon.errors.HTTPBadRequest('Posting objects is not supported on this resource.')
 
-            for attribute_dict in attributes:
-                self.apply_default_attributes('post_defaults', req, resp, attribute_dict)
+            if self._has_post_defaults:
+                for attribute_dict in attributes:
+                    self.apply_default_attributes('post_defaults', req, resp, attribute_dict)
 
             resources = [self.model(**attribute_dict) for attribute_dict in attributes]
 
@@ -553,10 +699,10 @@ class CollectionResource(BaseResource):
         }
         patches = req.context['doc']['patches']
 
-        with session_scope(self.db_engine, sessionmaker_=self.sessionmaker, **self.sessionmaker_kwargs) as db_session:
+        with factory_session_scope(self.session_factory) as db_session:
             for index, patch in enumerate(patches):
                 # Only support adding entities in a collection patch, for now
-                if 'op' not in patch or patch['op'] not in ['add']:
+                if 'op' not in patch or patch['op'] not in {'add'}:
                     raise falcon.errors.HTTPBadRequest('Invalid patch', 'Patch {0} is not valid'.format(index))
                 if patch['op'] == 'add':
                     if 'path' not in patch or patch['path'] not in patch_paths:
@@ -601,6 +747,100 @@ class SingleResource(BaseResource):
     def get_filter(self, req, resp, query, *args, **kwargs):
         return query
 
+    def _is_unconditional(self, req, precondition_name):
+        """
+        Whether the initial lookup already yields the row a precondition query
+        would, i.e. there are no query parameters to filter by and the named
+        precondition has not been overridden.
+        """
+        return not req.params and \
+            getattr(type(self), precondition_name) is getattr(SingleResource, precondition_name)
+
+    def entity_tag(self, resource, data=None):
+        """
+        Return a strong entity tag for an item.  For versioned models this is
+        the version counter, which changes with every update; otherwise it is
+        a hash of the canonical JSON encoding of the serialized item `data`.
+        """
+        if self._version_key is not None:
+            return str(getattr(resource, self._version_key))
+        canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _check_if_match(self, req, resp, resource, *args, **kwargs):
+        """
+        When entity tags are in use, enforce the If-Match header of a request
+        modifying `resource`, which is None if there is no such item yet.
+        """
+        if not getattr(self, 'use_etags', False):
+            return
+
+        if_match = req.if_match
+        if if_match is None:
+            if resource is not None and getattr(self, 'require_if_match', False):
+                raise falcon.errors.HTTPPreconditionRequired('Precondition Required', 'An If-Match header is required to modify this resource')
+            return
+
+        if resource is not None:
+            if '*' in if_match:
+                return
+            data = None
+            if self._version_key is None:
+                data = self.serialize(
+                    resource,
+                    _get_response_fields(self, req, resp, resource, *args, **kwargs),
+                    getattr(self, 'geometry_axes', {})
+                )
+            etag = self.entity_tag(resource, data)
+            # If-Match always uses the strong comparison, so weak tags never match
+            if any(tag == etag and not tag.is_weak for tag in if_match):
+                return
+        raise falcon.errors.HTTPPreconditionFailed('Precondition Failed', 'Resource has been modified')
+
+    def _conditional_update(self, conditional, resource, values):
+        """
+        Apply `values` to the row of `resource` with a single UPDATE, limited
+        by `conditional` and, for versioned models, by the version that was
+        read.  Return the number of rows updated.
+
+        Pending changes to `resource` are flushed first, as flushing them
+        during the UPDATE would move the version past the one it expects.
+        """
+        conditional = self._filter_version(conditional, resource)
+        mapper = inspect(self.model)
+        if self._version_key is not None and mapper.version_id_generator:
+            version = getattr(resource, self._version_key)
+            values = {**values, self._version_key: mapper.version_id_generator(version)}
+        return conditional.update(values, synchronize_session=False)
+
+    def _filter_version(self, conditional, resource):
+        """
+        Flush any pending changes to `resource` and, for versioned models,
+        limit `conditional` to the version of `resource` that was read.
+        """
+        conditional.session.flush()
+        if self._version_key is None:
+            return conditional
+        version = getattr(resource, self._version_key)
+        return conditional.filter(inspect(self.model).version_id_col == version)
+
+    def _one_conditionally(self, db_session, resources, conditional, action):
+        """
+        Fetch the single item matched by `conditional`, the lookup query
+        `resources` narrowed by any preconditions.  Only if nothing matches is
+        the lookup query checked, to tell a missing item from a violated
+        precondition.
+        """
+        try:
+            return conditional.one()
+        except sqlalchemy.orm.exc.NoResultFound:
+            if conditional is not resources and db_session.query(resources.exists()).scalar():
+                raise falcon.errors.HTTPConflict('Conflict', 'Resource found but conditions violated')
+            raise falcon.errors.HTTPNotFound()
+        except sqlalchemy.orm.exc.MultipleResultsFound:
+            self.logger.error('Programming error: multiple results found for {0} of model {1}'.format(action, self.model))
+            raise falcon.errors.HTTPInternalServerError('Internal Server Error', 'An internal server error occurred')
+
     @falcon.before(identify)
     @falcon.before(authorize)
     def on_get(self, req, resp, *args, **kwargs):
@@ -610,7 +850,9 @@ class SingleResource(BaseResource):
         if 'GET' not in getattr(self, 'methods', ['GET', 'PUT', 'PATCH', 'DELETE']):
             raise falcon.errors.HTTPMethodNotAllowed(getattr(self, 'methods', ['GET', 'PUT', 'PATCH', 'DELETE']))
 
-        with session_scope(self.db_engine, sessionmaker_=self.sessionmaker, **self.sessionmaker_kwargs) as db_session:
+        with factory_session_scope(self.session_factory) as db_session:
+            # Reads only, so there is never anything to flush before a query
+            db_session.autoflush = False
             column_filters = kwargs
             before_get = getattr(self, 'before_get', None)
             if before_get is not None:
@@ -638,12 +880,16 @@ class SingleResource(BaseResource):
                     getattr(self, 'geometry_axes', {})
                 ),
             }
+            if getattr(self, 'use_etags', False):
+                resp.etag = self.entity_tag(resource[0] if len(extra_select) > 0 else resource, result['data'])
             if '__included' in req.params:
                 allowed_included = getattr(self, 'allowed_included', {})
+                requested_included = req.get_param_as_list('__included')
+                invalid = set(requested_included).difference(allowed_included)
+                if invalid:
+                    raise falcon.errors.HTTPBadRequest('Invalid parameter', 'The "__included" parameter includes invalid entities: {0}'.format(sorted(invalid)))
                 result['included'] = []
-                for included in req.get_param_as_list('__included'):
-                    if included not in allowed_included:
-                        raise falcon.errors.HTTPBadRequest('Invalid parameter', 'The "__included" parameter includes invalid entities')
+                for included in requested_included:
                     included_resources  = allowed_included[included]['link'](resource)
                     response_fields     = allowed_included[included].get('response_fields')
                     geometry_axes       = allowed_included[included].get('geometry_axes')
@@ -672,24 +918,20 @@ class SingleResource(BaseResource):
             resource_meta = getattr(self, 'meta', {})
             if callable(resource_meta):
                 if len(extra_select) > 0:
-                    meta_dict = resource_meta(req, resp, *list(itertools.chain(resource, args)), **kwargs)
+                    meta_dict = resource_meta(req, resp, *resource, *args, **kwargs)
                 else:
                     meta_dict = resource_meta(req, resp, resource, *args, **kwargs)
                 if meta_dict is not None:
                     if 'meta' not in result:
                         result['meta'] = {}
                     result['meta'].update(meta_dict)
-            else:
-                meta_dict = resource_meta
-
-                if len(meta_dict.keys()) > 0:
-                    if 'meta' not in result:
-                        result['meta'] = {}
-                    for key, value in meta_dict.items():
-                        if len(extra_select) > 0:
-                            result['meta'][key] = value(*resource)
-                        else:
-                            result['meta'][key] = value(resource)
+            elif 'meta' in self._compiled_meta:
+                if 'meta' not in result:
+                    result['meta'] = {}
+                if len(extra_select) > 0:
+                    result['meta'].update(self._compiled_meta['meta'](*resource))
+                else:
+                    result['meta'].update(self._compiled_meta['meta'](resource))
 
             req.context['result'] = result
 
@@ -709,58 +951,43 @@ class SingleResource(BaseResource):
         if 'DELETE' not in getattr(self, 'methods', ['GET', 'PUT', 'PATCH', 'DELETE']):
             raise falcon.errors.HTTPMethodNotAllowed(getattr(self, 'methods', ['GET', 'PUT', 'PATCH', 'DELETE']))
 
-        with session_scope(self.db_engine, sessionmaker_=self.sessionmaker, **self.sessionmaker_kwargs) as db_session:
+        with factory_session_scope(self.session_factory) as db_session:
             resources = self.apply_arg_filter(req, resp, db_session.query(self.model), kwargs)
 
-            try:
-                resource = resources.one()
-            except sqlalchemy.orm.exc.NoResultFound:
-                raise falcon.errors.HTTPNotFound()
-            except sqlalchemy.orm.exc.MultipleResultsFound:
-                self.logger.error('Programming error: multiple results found for patch of model {0}'.format(self.model))
-                raise falcon.errors.HTTPInternalServerError('Internal Server Error', 'An internal server error occurred')
-
-            resources = self.delete_precondition(
-                req, resp,
-                self.filter_by_params(resources, req.params),
-                *args, **kwargs
-            )
+            conditional = resources
+            if not self._is_unconditional(req, 'delete_precondition'):
+                conditional = self.delete_precondition(
+                    req, resp,
+                    self.filter_by_params(resources, req.params),
+                    *args, **kwargs
+                )
 
-            try:
-                resource = resources.one()
-            except sqlalchemy.orm.exc.NoResultFound:
-                raise falcon.errors.HTTPConflict('Conflict', 'Resource found but conditions violated')
-            except sqlalchemy.orm.exc.MultipleResultsFound:
-                self.logger.error('Programming error: multiple results found for delete of model {0}'.format(self.model))
-                raise falcon.errors.HTTPInternalServerError('Internal Server Error', 'An internal server error occurred')
+            resource = self._one_conditionally(db_session, resources, conditional, 'delete')
+            self._check_if_match(req, resp, resource, *args, **kwargs)
 
             before_delete = getattr(self, 'before_delete', None)
             if before_delete is not None:
                 self.before_delete(req, resp, db_session, resource, *args, **kwargs)
 
-            try:
+            with self._translate_db_errors(db_session, foreign_key=True, stale=True):
+                mark_deleted_values = getattr(self, 'mark_deleted_values', None)
                 mark_deleted = getattr(self, 'mark_deleted', None)
-                if mark_deleted is not None:
+                if mark_deleted_values is not None:
+                    values = mark_deleted_values(req, resp, *args, **kwargs)
+                    if self._conditional_update(conditional, resource, values) == 0:
+                        raise falcon.errors.HTTPConflict('Conflict', 'Resource found but conditions violated')
+                elif mark_deleted is not None:
                     mark_deleted(req, resp, resource, *args, **kwargs)
                     db_session.add(resource)
                 else:
+                    # The preconditions and the version that was read are
+                    # part of the DELETE itself, so a row changed since it
+                    # was read is left alone
+                    conditional = self._filter_version(conditional, resource)
                     make_transient(resource)
-                    resources.delete()
+                    if conditional.delete() == 0:
+                        raise falcon.errors.HTTPConflict('Conflict', 'Resource found but conditions violated')
                 db_session.commit()
-            except sqlalchemy.exc.IntegrityError as err:
-                # As far we I know, this should only be caused by foreign key constraint being violated
-                db_session.rollback()
-                raise falcon.errors.HTTPConflict('Conflict', 'Other content links to this')
-            except sqlalchemy.orm.exc.StaleDataError as err:
-                # Version field in the model was not as expected
-                db_session.rollback()
-                raise falcon.errors.HTTPConflict('Conflict', 'Resource found but conditions violated')
-            except sqlalchemy.exc.ProgrammingError as err:
-                db_session.rollback()
-                if self._is_foreign_key_violation(err):
-                    raise falcon.errors.HTTPConflict('Conflict', 'Other content links to this')
-                else:
-                    raise
 
             resp.status = falcon.HTTP_OK
             req.context['result'] = {}
@@ -779,8 +1006,8 @@ class SingleResource(BaseResource):
         if 'PUT' not in getattr(self, 'methods', ['GET', 'PUT', 'PATCH', 'DELETE']):
             raise falcon.errors.HTTPMethodNotAllowed(getattr(self, 'methods', ['GET', 'PUT', 'PATCH', 'DELETE']))
 
-        with session_scope(self.db_engine, sessionmaker_=self.sessionmaker, **self.sessionmaker_kwargs) as db_session:
-            resources = self.apply_arg_filter(req, resp, db_session.query(self.model), kwargs)
+        with factory_session_scope(self.session_factory) as db_session:
+            resources = self.lock_query(self.apply_arg_filter(req, resp, db_session.query(self.model), kwargs))
 
             resource = None
             try:
@@ -791,6 +1018,12 @@ class SingleResource(BaseResource):
             except sqlalchemy.orm.exc.MultipleResultsFound:
                 self.logger.error('Programming error: multiple results found for put of model {0}'.format(self.model))
                 raise falcon.errors.HTTPInternalServerError('Internal Server Error', 'An internal server error occurred')
+            except sqlalchemy.exc.DatabaseError as err:
+                if not self._is_lock_not_available(err):
+                    raise
+                raise falcon.errors.HTTPConflict('Conflict', 'Resource is locked by another request')
+
+            self._check_if_match(req, resp, resource, *args, **kwargs)
 
             is_new = resource is None
             if is_new:
@@ -803,7 +1036,8 @@ class SingleResource(BaseResource):
                 raise falcon.errors.HTTPBadRequest('Invalid Request Body', 'Array bodies are only allowed with POST requests')
             attributes = attributes[0]
 
-            self.apply_default_attributes('put_defaults', req, resp, attributes)
+            if self._has_put_defaults:
+                self.apply_default_attributes('put_defaults', req, resp, attributes)
 
             for key, value in attributes.items():
                 setattr(resource, key, value)
@@ -815,6 +1049,8 @@ class SingleResource(BaseResource):
             req.context['result'] = {
                 'data': self.serialize(resource, _get_response_fields(self, req, resp, resource, *args, **kwargs), getattr(self, 'geometry_axes', {})),
             }
+            if getattr(self, 'use_etags', False):
+                resp.etag = self.entity_tag(resource, req.context['result']['data'])
 
             after_put = getattr(self, 'after_put', None)
             if after_put is not None:
@@ -835,27 +1071,25 @@ class SingleResource(BaseResource):
         if 'PATCH' not in getattr(self, 'methods', ['GET', 'PUT', 'PATCH', 'DELETE']):
             raise falcon.errors.HTTPMethodNotAllowed(getattr(self, 'methods', ['GET', 'PUT', 'PATCH', 'DELETE']))
 
-        with session_scope(self.db_engine, sessionmaker_=self.sessionmaker, **self.sessionmaker_kwargs) as db_session:
+        with factory_session_scope(self.session_factory) as db_session:
             resources = self.apply_arg_filter(req, resp, db_session.query(self.model), kwargs)
 
-            try:
-                resource = resources.one()
-            except sqlalchemy.orm.exc.NoResultFound:
-                raise falcon.errors.HTTPNotFound()
-            except sqlalchemy.orm.exc.MultipleResultsFound:
-                self.logger.error('Programming error: multiple results found for patch of model {0}'.format(self.model))
-                raise falcon.errors.HTTPInternalServerError('Internal Server Error', 'An internal server error occurred')
-
-            resources = self.patch_precondition(
-                req, resp,
-                self.filter_by_params(resources, req.params),
-                *args, **kwargs
-            )
+            conditional = resources
+            if not self._is_unconditional(req, 'patch_precondition'):
+                conditional = self.patch_precondition(
+                    req, resp,
+                    self.filter_by_params(resources, req.params),
+                    *args, **kwargs
+                )
 
             try:
-                resource = resources.one()
-            except sqlalchemy.orm.exc.NoResultFound:
-                raise falcon.errors.HTTPConflict('Conflict', 'Resource found but conditions violated')
+                resource = self._one_conditionally(db_session, resources, self.lock_query(conditional), 'patch')
+            except sqlalchemy.exc.DatabaseError as err:
+                if not self._is_lock_not_available(err):
+                    raise
+                raise falcon.errors.HTTPConflict('Conflict', 'Resource is locked by another request')
+
+            self._check_if_match(req, resp, resource, *args, **kwargs)
 
             attributes, _ = self.deserialize(self.model, {}, req.context['doc'], False)
 
@@ -863,7 +1097,8 @@ class SingleResource(BaseResource):
                 raise falcon.errors.HTTPBadRequest('Invalid Request Body', 'Array bodies are only allowed with POST requests')
             attributes = attributes[0]
 
-            self.apply_default_attributes('patch_defaults', req, resp, attributes)
+            if self._has_patch_defaults:
+                self.apply_default_attributes('patch_defaults', req, resp, attributes)
 
             for key, value in attributes.items():
                 setattr(resource, key, value)
@@ -875,33 +1110,15 @@ class SingleResource(BaseResource):
                 self.before_patch(req, resp, db_session, resource, *args, **kwargs)
 
             db_session.add(resource)
-            try:
+            with self._translate_db_errors(db_session, stale=True):
                 db_session.commit()
-            except sqlalchemy.exc.IntegrityError as err:
-                # Cases such as unallowed NULL value should have been checked
-                # before we got here (e.g. validate against schema
-                # using the middleware) - therefore assume this is a UNIQUE
-                # constraint violation
-                db_session.rollback()
-                raise falcon.errors.HTTPConflict('Conflict', 'Unique constraint violated')
-            except sqlalchemy.orm.exc.StaleDataError as err:
-                # Version field in the model was not as expected
-                db_session.rollback()
-                raise falcon.errors.HTTPConflict('Conflict', 'Resource found but conditions violated')
-            except sqlalchemy.exc.ProgrammingError as err:
-                db_session.rollback()
-                if self._is_unique_violation(err):
-                    raise falcon.errors.HTTPConflict('Conflict', 'Unique constraint violated')
-                else:
-                    raise
-            except:
-                db_session.rollback()
-                raise
 
             resp.status = falcon.HTTP_OK
             req.context['result'] = {
                 'data': self.serialize(resource, _get_response_fields(self, req, resp, resource, *args, **kwargs), getattr(self, 'geometry_axes', {})),
             }
+            if getattr(self, 'use_etags', False):
+                resp.etag = self.entity_tag(resource, req.context['result']['data'])
 
             after_patch = getattr(self, 'after_patch', None)
             if after_patch is not None:
@@ -24,6 +24,14 @@ def enable_foreign_keys(dbapi_connection, connection_record):
     result = dbapi_connection.execute(enable_fk_sql)
     result.close()
 
+def disable_sync(dbapi_connection, connection_record):
+    # The test database is thrown away, so there is no need to wait for
+    # commits to reach the disk.  It stays a file rather than an in-memory
+    # database, as tests racing two sessions need separate connections to it.
+    for pragma_sql in ['PRAGMA synchronous = OFF', 'PRAGMA journal_mode = MEMORY']:
+        result = dbapi_connection.execute(pragma_sql)
+        result.close()
+
 class BaseTestCase(unittest.TestCase):
     def tearDown(self):
         self.db_session.close()
@@ -69,6 +77,7 @@ class BaseTestCase(unittest.TestCase):
 
         if self.using_sqlite:
             listen(Pool, 'connect', enable_foreign_keys)
+            listen(Pool, 'connect', disable_sync)
 
         Base.metadata.create_all(self.db_engine)
 
@@ -144,6 +153,26 @@ class BaseTestCase(unittest.TestCase):
             }
         )
 
+    def assertPreconditionFailed(self, response, description='Resource has been modified'):
+        self.assertEqual(self.srmock.status, '412 Precondition Failed')
+        self.assertEqual(
+            json.loads(response.decode('utf-8')),
+            {
+                'title':        'Precondition Failed',
+                'description':  description,
+            }
+        )
+
+    def assertPreconditionRequired(self, response, description='An If-Match header is required to modify this resource'):
+        self.assertEqual(self.srmock.status, '428 Precondition Required')
+        self.assertEqual(
+            json.loads(response.decode('utf-8')),
+            {
+                'title':        'Precondition Required',
+                'description':  description,
+            }
+        )
+
     def assertInternalServerError(self, response):
         self.assertEqual(self.srmock.status, '500 Internal Server Error')
         self.assertEqual(
@@ -0,0 +1,107 @@
+from .test_base import Base, BaseTestCase
+from .test_fixtures import Account, VersionedAccount
+
+import json
+
+from .resource import SingleResource
+
+
+class AccountResource(SingleResource):
+    model = Account
+    use_etags = True
+
+class StrictAccountResource(SingleResource):
+    model = Account
+    use_etags = True
+    require_if_match = True
+
+class VersionedAccountResource(SingleResource):
+    model = VersionedAccount
+    use_etags = True
+
+
+class ETagTest(BaseTestCase):
+    def create_test_resources(self):
+        self.app.add_route('/accounts/{id}', AccountResource(self.db_engine))
+        self.app.add_route('/strict-accounts/{id}', StrictAccountResource(self.db_engine))
+        self.app.add_route('/versioned-accounts/{id}', VersionedAccountResource(self.db_engine))
+
+    def create_common_fixtures(self):
+        self.db_session.add(Account(id=1, name="Foo", owner=None))
+        self.db_session.commit()
+
+    def get_etag(self, path):
+        response, = self.simulate_request(path, method='GET', headers={'Accept': 'application/json'})
+        self.assertOK(response)
+        return dict(self.srmock.headers)['etag']
+
+    def test_get_etag(self):
+        etag = self.get_etag('/accounts/1')
+        self.assertEqual(etag, self.get_etag('/accounts/1'))
+
+        account = self.db_session.query(Account).get(1)
+        account.owner = 'Don Draper'
+        self.db_session.commit()
+
+        self.assertNotEqual(etag, self.get_etag('/accounts/1'))
+
+    def test_patch_if_match(self):
+        etag = self.get_etag('/accounts/1')
+
+        response, = self.simulate_request('/accounts/1', method='PATCH', body=json.dumps({'owner': 'Don Draper'}), headers={'Content-Type': 'application/json', 'Accept': 'application/json', 'If-Match': etag})
+        self.assertOK(response)
+        self.assertEqual(dict(self.srmock.headers)['etag'], self.get_etag('/accounts/1'))
+
+        # The item has changed since the client last saw it
+        response, = self.simulate_request('/accounts/1', method='PATCH', body=json.dumps({'owner': 'Pete Campbell'}), headers={'Content-Type': 'application/json', 'Accept': 'application/json', 'If-Match': etag})
+        self.assertPreconditionFailed(response)
+
+        response, = self.simulate_request('/accounts/1', method='PATCH', body=json.dumps({'owner': 'Pete Campbell'}), headers={'Content-Type': 'application/json', 'Accept': 'application/json', 'If-Match': '*'})
+        self.assertOK(response)
+
+        response, = self.simulate_request('/accounts/1', method='PATCH', body=json.dumps({'owner': 'Don Draper'}), headers={'Content-Type': 'application/json', 'Accept': 'application/json'})
+        self.assertOK(response)
+
+    def test_put_if_match(self):
+        response, = self.simulate_request('/accounts/1', method='PUT', body=json.dumps({'name': 'Bar', 'owner': None}), headers={'Content-Type': 'application/json', 'Accept': 'application/json', 'If-Match': '"stale"'})
+        self.assertPreconditionFailed(response)
+
+        etag = self.get_etag('/accounts/1')
+        response, = self.simulate_request('/accounts/1', method='PUT', body=json.dumps({'name': 'Bar', 'owner': None}), headers={'Content-Type': 'application/json', 'Accept': 'application/json', 'If-Match': etag})
+        self.assertOK(response)
+
+    def test_delete_if_match(self):
+        response, = self.simulate_request('/accounts/1', method='DELETE', headers={'Accept': 'application/json', 'If-Match': '"stale"'})
+        self.assertPreconditionFailed(response)
+
+        etag = self.get_etag('/accounts/1')
+        response, = self.simulate_request('/accounts/1', method='DELETE', headers={'Accept': 'application/json', 'If-Match': etag})
+        self.assertOK(response)
+
+        response = self.simulate_request('/accounts/1', method='GET', headers={'Accept': 'application/json'})
+        self.assertNotFound(response)
+
+    def test_require_if_match(self):
+        response, = self.simulate_request('/strict-accounts/1', method='PATCH', body=json.dumps({'owner': 'Don Draper'}), headers={'Content-Type': 'application/json', 'Accept': 'application/json'})
+        self.assertPreconditionRequired(response)
+
+        response, = self.simulate_request('/strict-accounts/1', method='DELETE', headers={'Accept': 'application/json'})
+        self.assertPreconditionRequired(response)
+
+        etag = self.get_etag('/strict-accounts/1')
+        response, = self.simulate_request('/strict-accounts/1', method='PATCH', body=json.dumps({'owner': 'Don Draper'}), headers={'Content-Type': 'application/json', 'Accept': 'application/json', 'If-Match': etag})
+        self.assertOK(response)
+
+    def test_versioned_etag(self):
+        self.db_session.add(VersionedAccount(id=1, name="Foo", owner=None))
+        self.db_session.commit()
+
+        etag = self.get_etag('/versioned-accounts/1')
+        self.assertEqual(etag, '"1"')
+
+        response, = self.simulate_request('/versioned-accounts/1', method='PATCH', body=json.dumps({'owner': 'Don Draper'}), headers={'Content-Type': 'application/json', 'Accept': 'application/json', 'If-Match': etag})
+        self.assertOK(response)
+        self.assertEqual(dict(self.srmock.headers)['etag'], '"2"')
+
+        response, = self.simulate_request('/versioned-accounts/1', method='PATCH', body=json.dumps({'owner': 'Pete Campbell'}), headers={'Content-Type': 'application/json', 'Accept': 'application/json', 'If-Match': etag})
+        self.assertPreconditionFailed(response)
@@ -131,7 +131,7 @@ class PreconditionTest(BaseTestCase):
 
     def test_invalid_included(self):
         response, = self.simulate_request('/employees/1', method='GET', query_string='__included=nonexistent', headers={'Accept': 'application/json'})
-        self.assertBadRequest(response, 'Invalid parameter', 'The "__included" parameter includes invalid entities')
+        self.assertBadRequest(response, 'Invalid parameter', 'The "__included" parameter includes invalid entities: [\'nonexistent\']')
 
     def test_included(self):
         response, = self.simulate_request('/employees/1', method='GET', headers={'Accept': 'application/json'})
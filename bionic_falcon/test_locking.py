@@ -0,0 +1,69 @@
+from .test_fixtures import Account
+
+from types import SimpleNamespace
+from sqlalchemy.dialects import mysql, postgresql
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+import unittest
+
+from .resource import SingleResource
+
+
+class AccountResource(SingleResource):
+    model = Account
+    lock_for_update = True
+
+class UnlockedAccountResource(SingleResource):
+    model = Account
+
+
+def fake_engine(url):
+    # Only the URL is consulted, so no database driver is needed
+    return SimpleNamespace(url=make_url(url))
+
+def fake_error(*args, **attrs):
+    return SimpleNamespace(orig=SimpleNamespace(args=args, **attrs))
+
+
+class LockingTest(unittest.TestCase):
+    def compile(self, resource, dialect):
+        query = resource.lock_query(Session().query(Account))
+        return str(query.statement.compile(dialect=dialect))
+
+    def test_lock_query(self):
+        resource = AccountResource(fake_engine('postgresql://localhost/bionic'))
+        self.assertIn('FOR UPDATE NOWAIT', self.compile(resource, postgresql.dialect()))
+
+        resource = AccountResource(fake_engine('mysql://localhost/bionic'))
+        self.assertIn('FOR UPDATE NOWAIT', self.compile(resource, mysql.dialect()))
+
+    def test_lock_query_not_requested(self):
+        resource = UnlockedAccountResource(fake_engine('postgresql://localhost/bionic'))
+        self.assertNotIn('FOR UPDATE', self.compile(resource, postgresql.dialect()))
+
+    def test_lock_query_sqlite(self):
+        resource = AccountResource(fake_engine('sqlite://'))
+        query = Session().query(Account)
+        self.assertIs(resource.lock_query(query), query)
+
+    def test_is_lock_not_available_postgresql(self):
+        resource = AccountResource(fake_engine('postgresql://localhost/bionic'))
+        self.assertTrue(resource._is_lock_not_available(fake_error('could not obtain lock', pgcode='55P03')))
+        self.assertTrue(resource._is_lock_not_available(fake_error('ERROR', '55P03', 'could not obtain lock')))
+        self.assertFalse(resource._is_lock_not_available(fake_error('syntax error', pgcode='42601')))
+        self.assertFalse(resource._is_lock_not_available(fake_error('ERROR', '42601', 'syntax error')))
+
+    def test_is_lock_not_available_mysql(self):
+        resource = AccountResource(fake_engine('mysql://localhost/bionic'))
+        self.assertTrue(resource._is_lock_not_available(fake_error(3572, 'Statement aborted because lock(s) could not be acquired immediately and NOWAIT is set.')))
+        self.assertTrue(resource._is_lock_not_available(fake_error(1205, 'Lock wait timeout exceeded; try restarting transaction')))
+        self.assertFalse(resource._is_lock_not_available(fake_error(1064, 'You have an error in your SQL syntax')))
+
+    def test_is_lock_not_available_oracle(self):
+        resource = AccountResource(fake_engine('oracle://localhost/bionic'))
+        self.assertTrue(resource._is_lock_not_available(fake_error(SimpleNamespace(code=54, message='ORA-00054: resource busy'))))
+        self.assertFalse(resource._is_lock_not_available(fake_error(SimpleNamespace(code=942, message='ORA-00942: table or view does not exist'))))
+
+    def test_is_lock_not_available_other(self):
+        resource = AccountResource(fake_engine('sqlite://'))
+        self.assertFalse(resource._is_lock_not_available(fake_error('ERROR', '55P03')))
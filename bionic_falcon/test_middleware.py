@@ -1,4 +1,4 @@
-from .middleware import Middleware
+from .middleware import Middleware, _loads
 from .schema import request_schema, response_schema, SchemaDecoratorError
 
 import falcon, falcon.testing
@@ -99,3 +99,8 @@ class MiddlewareTest(unittest.TestCase):
         body = json.dumps({'email': 'foo@example.com', 'password': 'hunter2'})
         response, = self.simulate_request('/test_keep_body', method='POST', body=body, headers={'Accept': 'application/json', 'Content-Type': 'application/json'})
         self.assertEqual(self.keep_body_resource.request_body, body.encode('utf-8'))
+
+    def test_parse_wide_integers_exactly(self):
+        self.assertEqual(_loads(b'{"amount": 123456789012345678901234567890}'), {'amount': 123456789012345678901234567890})
+        self.assertEqual(_loads(b'{"amount": -9223372036854775809}'), {'amount': -9223372036854775809})
+        self.assertEqual(_loads(b'{"amount": 123456789012345678}'), {'amount': 123456789012345678})
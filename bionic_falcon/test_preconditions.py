@@ -4,6 +4,8 @@ from .test_fixtures import VersionedAccount
 
 from falcon.errors import HTTPUnauthorized, HTTPForbidden
 import json
+from sqlalchemy import func, insert
+import threading
 
 from .resource import CollectionResource, SingleResource
 
@@ -16,8 +18,16 @@ class AccountCollectionResource(CollectionResource):
         # Only allow getting accounts below id 5
         return query.filter(VersionedAccount.id < 5, VersionedAccount.deleted == None)
 
-do_before_patch     = None
-do_before_delete    = None
+def seed_accounts(db_session, rows):
+    # A single INSERT, bypassing the ORM, so the version is set here
+    db_session.execute(insert(VersionedAccount), [{'version_id': 1, **row} for row in rows])
+    db_session.commit()
+
+# Built once, as SQLAlchemy clauses can be shared between queries
+_NOT_OWNED = VersionedAccount.owner == None
+
+# Hooks run by the resource, set per test
+_HOOKS = threading.local()
 
 class AccountResource(SingleResource):
     model = VersionedAccount
@@ -30,48 +40,62 @@ class AccountResource(SingleResource):
     def patch_precondition(self, req, resp, query, *args, **kwargs):
         # Only allow setting owner of non-owned account
         if 'owner' in req.context['doc'] and req.context['doc']['owner'] is not None:
-            return query.filter(VersionedAccount.owner == None)
+            return query.filter(_NOT_OWNED)
         else:
             return query
 
-    def before_patch(req, resp, db_session, resource, *args, **kwargs):
-        if do_before_patch is not None:
-            do_before_patch(req, resp, db_session, resource, *args, **kwargs)
+    def before_patch(self, req, resp, db_session, resource, *args, **kwargs):
+        hook = getattr(_HOOKS, 'patch', None)
+        if hook is not None:
+            hook(req, resp, db_session, resource, *args, **kwargs)
 
     def delete_precondition(self, req, resp, query, *args, **kwargs):
         # Only allow deletes of non-owned accounts
-        return query.filter(VersionedAccount.owner == None)
+        return query.filter(_NOT_OWNED)
 
-    def before_delete(req, resp, db_session, resource, *args, **kwargs):
-        if do_before_delete is not None:
-            do_before_delete(req, resp, db_session, resource, *args, **kwargs)
+    def before_delete(self, req, resp, db_session, resource, *args, **kwargs):
+        hook = getattr(_HOOKS, 'delete', None)
+        if hook is not None:
+            hook(req, resp, db_session, resource, *args, **kwargs)
 
     def mark_deleted(self, req, resp, resource, *args, **kwargs):
         resource.deleted = datetime.utcnow()
 
+class SoftDeleteAccountResource(AccountResource):
+    def mark_deleted_values(self, req, resp, *args, **kwargs):
+        return {'deleted': func.now()}
+
+class HardDeleteAccountResource(AccountResource):
+    mark_deleted = None
+
+class HardDeleteETagAccountResource(HardDeleteAccountResource):
+    use_etags = True
+
 
 class PreconditionTest(BaseTestCase):
     def setUp(self):
         super(PreconditionTest, self).setUp()
-        global do_before_patch, do_before_delete
-        do_before_patch     = None
-        do_before_delete    = None
+        _HOOKS.patch    = None
+        _HOOKS.delete   = None
 
     def tearDown(self):
         super(PreconditionTest, self).tearDown()
-        global do_before_patch, do_before_delete
-        do_before_patch     = None
-        do_before_delete    = None
+        _HOOKS.patch    = None
+        _HOOKS.delete   = None
 
     def create_test_resources(self):
         self.app.add_route('/accounts', AccountCollectionResource(self.db_engine))
         self.app.add_route('/accounts/{id}', AccountResource(self.db_engine))
+        self.app.add_route('/soft-accounts/{id}', SoftDeleteAccountResource(self.db_engine))
+        self.app.add_route('/hard-accounts/{id}', HardDeleteAccountResource(self.db_engine))
+        self.app.add_route('/hard-etag-accounts/{id}', HardDeleteETagAccountResource(self.db_engine))
 
     def test_collection_get_filter(self):
-        self.db_session.add(VersionedAccount(id=1, name="Foo", owner=None))
-        self.db_session.add(VersionedAccount(id=2, name="Bar", owner=None))
-        self.db_session.add(VersionedAccount(id=5, name="Baz", owner=None))
-        self.db_session.commit()
+        seed_accounts(self.db_session, [
+            {'id': 1, 'name': 'Foo', 'owner': None},
+            {'id': 2, 'name': 'Bar', 'owner': None},
+            {'id': 5, 'name': 'Baz', 'owner': None},
+        ])
 
         response, = self.simulate_request('/accounts', method='GET', headers={'Accept': 'application/json'})
         self.assertOK(response, {'data': [{'id': 1, 'name': 'Foo', 'owner': None}, {'id': 2, 'name': 'Bar', 'owner': None}]})
@@ -86,10 +110,11 @@ class PreconditionTest(BaseTestCase):
         self.assertOK(response, {'data': [{'id': 1, 'name': 'Foo', 'owner': None}, {'id': 2, 'name': 'Bar', 'owner': None}]})
 
     def test_get_filter(self):
-        self.db_session.add(VersionedAccount(id=1, name="Foo", owner=None))
-        self.db_session.add(VersionedAccount(id=2, name="Bar", owner=None))
-        self.db_session.add(VersionedAccount(id=5, name="Baz", owner=None))
-        self.db_session.commit()
+        seed_accounts(self.db_session, [
+            {'id': 1, 'name': 'Foo', 'owner': None},
+            {'id': 2, 'name': 'Bar', 'owner': None},
+            {'id': 5, 'name': 'Baz', 'owner': None},
+        ])
 
         response, = self.simulate_request('/accounts/1', method='GET', headers={'Accept': 'application/json'})
         self.assertOK(response, {'data': {'id': 1, 'name': 'Foo', 'owner': None}})
@@ -151,8 +176,7 @@ class PreconditionTest(BaseTestCase):
             account.owner = 'Pete Campbell'
             self.db_session.add(account)
             self.db_session.commit()
-        global do_before_patch
-        do_before_patch = set_owner_in_other_process
+        _HOOKS.patch = set_owner_in_other_process
 
         response, = self.simulate_request('/accounts/1', method='PATCH', body=json.dumps({'owner': 'Don Draper'}), headers={'Content-Type': 'application/json', 'Accept': 'application/json'})
         self.assertConflict(response, 'Resource found but conditions violated')
@@ -161,9 +185,10 @@ class PreconditionTest(BaseTestCase):
         self.assertOK(response, {'data': {'id': 1, 'name': 'Foo', 'owner': 'Pete Campbell'}})
 
     def test_delete_precondition(self):
-        self.db_session.add(VersionedAccount(id=1, name="Foo", owner=None))
-        self.db_session.add(VersionedAccount(id=2, name="Bar", owner="Don Draper"))
-        self.db_session.commit()
+        seed_accounts(self.db_session, [
+            {'id': 1, 'name': 'Foo', 'owner': None},
+            {'id': 2, 'name': 'Bar', 'owner': 'Don Draper'},
+        ])
 
         response, = self.simulate_request('/accounts/1', method='DELETE', headers={'Accept': 'application/json'})
         self.assertOK(response)
@@ -186,11 +211,80 @@ class PreconditionTest(BaseTestCase):
             account.owner = 'Don Draper'
             self.db_session.add(account)
             self.db_session.commit()
-        global do_before_delete
-        do_before_delete = set_owner_in_other_process
+        _HOOKS.delete = set_owner_in_other_process
 
         response, = self.simulate_request('/accounts/1', method='DELETE', headers={'Accept': 'application/json'})
         self.assertConflict(response, 'Resource found but conditions violated')
 
         response, = self.simulate_request('/accounts/1', method='GET', headers={'Accept': 'application/json'})
         self.assertOK(response, {'data': {'id': 1, 'name': 'Foo', 'owner': 'Don Draper'}})
+
+    def test_hard_delete_precondition_with_race_condition(self):
+        self.db_session.add(VersionedAccount(id=1, name="Foo", owner=None))
+        self.db_session.commit()
+
+        def set_owner_in_other_process(req, resp, db_session, resource, *args, **kwargs):
+            account = self.db_session.query(VersionedAccount).get(1)
+            account.owner = 'Don Draper'
+            self.db_session.add(account)
+            self.db_session.commit()
+        _HOOKS.delete = set_owner_in_other_process
+
+        response, = self.simulate_request('/hard-accounts/1', method='DELETE', headers={'Accept': 'application/json'})
+        self.assertConflict(response, 'Resource found but conditions violated')
+
+        response, = self.simulate_request('/accounts/1', method='GET', headers={'Accept': 'application/json'})
+        self.assertOK(response, {'id': 1, 'name': 'Foo', 'owner': 'Don Draper'})
+
+    def test_hard_delete_if_match_with_race_condition(self):
+        self.db_session.add(VersionedAccount(id=1, name="Foo", owner=None))
+        self.db_session.commit()
+
+        def rename_in_other_process(req, resp, db_session, resource, *args, **kwargs):
+            account = self.db_session.query(VersionedAccount).get(1)
+            account.name = 'Bar'
+            self.db_session.add(account)
+            self.db_session.commit()
+        _HOOKS.delete = rename_in_other_process
+
+        response, = self.simulate_request('/hard-etag-accounts/1', method='DELETE', headers={'Accept': 'application/json', 'If-Match': '"1"'})
+        self.assertConflict(response, 'Resource found but conditions violated')
+
+        response, = self.simulate_request('/accounts/1', method='GET', headers={'Accept': 'application/json'})
+        self.assertOK(response, {'id': 1, 'name': 'Bar', 'owner': None})
+
+    def test_soft_delete_precondition_with_race_condition(self):
+        self.db_session.add(VersionedAccount(id=1, name="Foo", owner=None))
+        self.db_session.commit()
+
+        def set_owner_in_other_process(req, resp, db_session, resource, *args, **kwargs):
+            account = self.db_session.query(VersionedAccount).get(1)
+            account.owner = 'Don Draper'
+            self.db_session.add(account)
+            self.db_session.commit()
+        _HOOKS.delete = set_owner_in_other_process
+
+        response, = self.simulate_request('/soft-accounts/1', method='DELETE', headers={'Accept': 'application/json'})
+        self.assertConflict(response, 'Resource found but conditions violated')
+
+        response, = self.simulate_request('/accounts/1', method='GET', headers={'Accept': 'application/json'})
+        self.assertOK(response, {'id': 1, 'name': 'Foo', 'owner': 'Don Draper'})
+
+    def test_soft_delete_with_changes_before_delete(self):
+        self.db_session.add(VersionedAccount(id=1, name="Foo", owner=None))
+        self.db_session.commit()
+
+        def rename(req, resp, db_session, resource, *args, **kwargs):
+            resource.name = 'Bar'
+        _HOOKS.delete = rename
+
+        response, = self.simulate_request('/soft-accounts/1', method='DELETE', headers={'Accept': 'application/json'})
+        self.assertOK(response)
+
+        response = self.simulate_request('/accounts/1', method='GET', headers={'Accept': 'application/json'})
+        self.assertNotFound(response)
+
+        self.db_session.expire_all()
+        account = self.db_session.query(VersionedAccount).get(1)
+        self.assertEqual(account.name, 'Bar')
+        self.assertIsNotNone(account.deleted)
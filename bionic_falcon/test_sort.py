@@ -18,12 +18,20 @@ class InvalidDefaultSortCharacterCollectionResource(CollectionResource):
     model = Character
     default_sort = ['name', 'xid']
 
+class YieldPerCharacterCollectionResource(CollectionResource):
+    model = Character
+    yield_per = 2
+    resource_meta = {
+        'initial':  lambda resource: resource.name[0]
+    }
+
 
 class SortTest(BaseTestCase):
     def create_test_resources(self):
         self.app.add_route('/characters', CharacterCollectionResource(self.db_engine))
         self.app.add_route('/default-sort-characters', DefaultSortCharacterCollectionResource(self.db_engine))
         self.app.add_route('/invalid-default-sort-characters', InvalidDefaultSortCharacterCollectionResource(self.db_engine))
+        self.app.add_route('/yield-per-characters', YieldPerCharacterCollectionResource(self.db_engine))
 
     def create_common_fixtures(self):
         response, = self.simulate_request('/characters', method='POST', body=json.dumps({'id': 1, 'name': 'John'}), headers={'Accept': 'application/json', 'Content-Type': 'application/json'})
@@ -252,6 +260,26 @@ class SortTest(BaseTestCase):
             }
         })
 
+    def test_paging_yield_per(self):
+        response, = self.simulate_request('/yield-per-characters', query_string='__sort=id&__offset=3&__limit=8', method='GET', headers={'Accept': 'application/json'})
+        self.assertOK(response, {
+            'data': [
+                {'id': 4, 'name': 'Laurel', 'team_id': None, 'meta': {'initial': 'L'}},
+                {'id': 5, 'name': 'Felicity', 'team_id': None, 'meta': {'initial': 'F'}},
+                {'id': 6, 'name': 'Oliver', 'team_id': None, 'meta': {'initial': 'O'}},
+                {'id': 7, 'name': 'Roy', 'team_id': None, 'meta': {'initial': 'R'}},
+                {'id': 8, 'name': 'Iris', 'team_id': None, 'meta': {'initial': 'I'}},
+                {'id': 9, 'name': 'Caitlin', 'team_id': None, 'meta': {'initial': 'C'}},
+                {'id': 10, 'name': 'Cisco', 'team_id': None, 'meta': {'initial': 'C'}},
+                {'id': 11, 'name': 'Cisco', 'team_id': None, 'meta': {'initial': 'C'}},
+            ],
+            'meta': {
+                'offset':   3,
+                'limit':    8,
+                'total':    12,
+            }
+        })
+
     def test_paging_types(self):
         response, = self.simulate_request('/characters', query_string='__sort=-name,id&__offset=abc', method='GET', headers={'Accept': 'application/json'})
         self.assertBadRequest(response, title='Invalid parameter', description='The "__offset" parameter is invalid. The value must be an integer.')
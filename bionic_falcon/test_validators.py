@@ -0,0 +1,65 @@
+from . import middleware
+from .middleware import _compile_validator, support_fastjsonschema, support_jsonschema_rs
+
+import jsonschema
+import unittest
+from unittest import mock
+
+
+DRAFT_07 = 'http://json-schema.org/draft-07/schema#'
+
+# Schemas and instances on which every backend must agree with jsonschema
+CASES = [
+    ({'type': 'object', 'required': ['name']}, {'name': 'Foo'}),
+    ({'type': 'object', 'required': ['name']}, {'owner': 'Foo'}),
+    ({'type': 'object', 'properties': {'id': {'type': 'integer'}}}, {'id': 'one'}),
+    # Keywords only known to later drafts, which apply when $schema is absent
+    ({'properties': {'a': {}}, 'unevaluatedProperties': False}, {'a': 1}),
+    ({'properties': {'a': {}}, 'unevaluatedProperties': False}, {'a': 1, 'b': 2}),
+    ({'prefixItems': [{'type': 'integer'}]}, ['one']),
+    ({'dependentRequired': {'a': ['b']}}, {'a': 1}),
+    # Formats are annotations only, as jsonschema is given no format checker
+    ({'format': 'email'}, 'not an email'),
+    ({'$schema': DRAFT_07, 'format': 'email'}, 'not an email'),
+    ({'$schema': DRAFT_07, 'additionalProperties': False, 'properties': {'a': {}}}, {'a': 1}),
+    ({'$schema': DRAFT_07, 'additionalProperties': False, 'properties': {'a': {}}}, {'a': 1, 'b': 2}),
+]
+
+
+class ValidatorParityTest(unittest.TestCase):
+    def assertParity(self):
+        for schema, instance in CASES:
+            expected = jsonschema.validators.validator_for(schema)(schema).is_valid(instance)
+            try:
+                _compile_validator(schema)(instance)
+                actual = True
+            except jsonschema.exceptions.ValidationError:
+                actual = False
+            self.assertEqual(actual, expected, 'validating {0!r} against {1!r}'.format(instance, schema))
+
+    def test_jsonschema(self):
+        with mock.patch.object(middleware, 'support_jsonschema_rs', False), \
+                mock.patch.object(middleware, 'support_fastjsonschema', False):
+            self.assertParity()
+
+    @unittest.skipUnless(support_fastjsonschema, 'fastjsonschema is not installed')
+    def test_fastjsonschema(self):
+        with mock.patch.object(middleware, 'support_jsonschema_rs', False):
+            self.assertParity()
+
+    @unittest.skipUnless(support_fastjsonschema, 'fastjsonschema is not installed')
+    def test_fastjsonschema_without_use_formats(self):
+        # Releases predating use_formats fall back to jsonschema
+        with mock.patch.object(middleware, 'support_jsonschema_rs', False), \
+                mock.patch.object(middleware.fastjsonschema, 'compile', side_effect=TypeError):
+            self.assertParity()
+
+    @unittest.skipUnless(support_jsonschema_rs, 'jsonschema-rs is not installed')
+    def test_jsonschema_rs(self):
+        self.assertParity()
+
+    @unittest.skipUnless(support_jsonschema_rs, 'jsonschema-rs is not installed')
+    def test_jsonschema_rs_without_validate_formats(self):
+        # Releases predating validate_formats fall back to another backend
+        with mock.patch.object(middleware.jsonschema_rs, 'validator_for', side_effect=TypeError):
+            self.assertParity()